@@ -6,16 +6,32 @@ Monitors a directory for new AppImages and automatically generates corresponding
 """
 
 import os
+import re
+import json
+import errno
+import fcntl
+import hashlib
 import sys
-import time
 import shutil
+import stat
+import signal
+import struct
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import logging
 
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -27,156 +43,572 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Icon theme cache and the size buckets icons are sorted into
+ICON_CACHE_DIR = Path.home() / '.local/share/icons/hicolor'
+ICON_CACHE_SUBDIRS = (
+    '16x16/apps',
+    '32x32/apps',
+    '48x48/apps',
+    '64x64/apps',
+    '128x128/apps',
+    'scalable/apps',
+)
+
+# Extraction results are keyed by AppImage fingerprint and shared between
+# the monitor and generate_once
+INDEX_DIR = Path.home() / '.cache/appimage-monitor'
+INDEX_FILE = INDEX_DIR / 'index.json'
+INDEX_LOCK = INDEX_DIR / 'index.lock'
+FINGERPRINT_CHUNK = 64 * 1024
+
+# Also cache bitmap icons for AppImages that ship an SVG; set
+# APPIMAGE_CACHE_ALL_ICONS=1 in the environment to enable
+CACHE_ALL_ICONS = os.environ.get('APPIMAGE_CACHE_ALL_ICONS', '') not in ('', '0')
+
+# Upper bound on AppImages processed concurrently
+MAX_WORKERS = 4
+
+# Seconds without events for a file before it is processed
+EVENT_SETTLE_DELAY = 1.5
+
+# Seconds of quiet before update-desktop-database runs
+DB_UPDATE_DELAY = 2.0
+
+ICON_SUFFIXES = frozenset({'.png', '.svg', '.xpm', '.ico'})
+
+# ioctl request for a whole-file reflink (linux/fs.h)
+FICLONE = 0x40049409
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Icon theme size directories, e.g. usr/share/icons/hicolor/256x256/apps
+ICON_SIZE_RE = re.compile(r'/(\d+)x(\d+)/')
+
+# Resolved once so each run skips the PATH lookup; None if not installed
+UPDATE_DB = shutil.which('update-desktop-database')
+
+# The icon-only pattern pass extracts into tmpfs when available; the full
+# extract fallback can be hundreds of MB and uses the default temp dir
+EXTRACT_TMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+
+# Category keyword table, checked in order; first matching category wins
+CATEGORY_KEYWORDS = (
+    ('browser', 'Network;WebBrowser;', ('chrome', 'firefox', 'edge', 'brave', 'opera', 'safari', 'chromium', 'librewolf', 'libre')),
+    ('dev', 'Development;IDE;', ('code', 'studio', 'ide', 'editor', 'vim', 'emacs', 'sublime')),
+    ('media', 'AudioVideo;Audio;Video;', ('player', 'vlc', 'mpv', 'kodi', 'spotify', 'audacity')),
+    ('graphics', 'Graphics;2DGraphics;3DGraphics;', ('gimp', 'inkscape', 'blender', 'krita', 'darktable')),
+    ('office', 'Office;', ('libreoffice', 'openoffice', 'word', 'excel', 'powerpoint')),
+    ('game', 'Game;', ('game', 'steam', 'minecraft', 'roblox')),
+    ('system', 'System;', ('terminal', 'system', 'admin', 'disk', 'backup')),
+)
+
+# One lookahead branch per category, anchored at the start of the name, so a
+# single match() keeps the table's priority order regardless of keyword position
+CATEGORY_RE = re.compile(
+    '|'.join(
+        f"(?P<{group}>(?=.*?(?:{'|'.join(map(re.escape, keywords))})))"
+        for group, _, keywords in CATEGORY_KEYWORDS
+    ),
+    re.DOTALL
+)
+CATEGORY_MAP = {group: category for group, category, _ in CATEGORY_KEYWORDS}
+
+# Paths passed to --appimage-extract; the runtime matches them with
+# FNM_PATHNAME | FNM_LEADING_DIR and accepts a single pattern per call
+ICON_EXTRACT_PATTERNS = (
+    '*.png',
+    '*.svg',
+    '*.xpm',
+    '*.ico',
+    'usr/share/icons',
+    'usr/share/pixmaps',
+)
+
+# Directories already created by this process
+_ensured_dirs = set()
+
+def _ensure_dir(path):
+    """mkdir -p path, at most once per process."""
+    if path not in _ensured_dirs:
+        path.mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(path)
+
+def _ensure_icon_cache_dirs():
+    """Create every icon cache bucket up front so the caching loop never has to."""
+    for subdir in ICON_CACHE_SUBDIRS:
+        _ensure_dir(ICON_CACHE_DIR / subdir)
+
+def _fingerprint(appimage_path):
+    """Fast content fingerprint: size, mtime and the first and last 64 KiB."""
+    stat = appimage_path.stat()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(appimage_path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if stat.st_size > FINGERPRINT_CHUNK:
+            f.seek(max(stat.st_size - FINGERPRINT_CHUNK, FINGERPRINT_CHUNK))
+            digest.update(f.read(FINGERPRINT_CHUNK))
+    return digest.hexdigest()
+
+@contextmanager
+def _locked_index(exclusive=False):
+    """Hold a flock on the index so concurrent processes see consistent data."""
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    with open(INDEX_LOCK, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _read_index():
+    try:
+        with open(INDEX_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _cached_icon_name(fingerprint):
+    """
+    Return the icon name recorded for this fingerprint, if any. Entries whose
+    cached icon file has since disappeared count as misses.
+    """
+    try:
+        with _locked_index():
+            entry = _read_index().get(fingerprint)
+    except OSError as e:
+        logger.warning(f"Could not read extraction cache: {e}")
+        return None
+    if not entry or 'icon_path' not in entry:
+        return None
+    if not (ICON_CACHE_DIR / entry['icon_path']).exists():
+        return None
+    return entry['icon_name']
+
+def _store_icon_path(fingerprint, icon_path):
+    """Record the cached icon (a path under ICON_CACHE_DIR) for this fingerprint."""
+    try:
+        with _locked_index(exclusive=True):
+            index = _read_index()
+            index[fingerprint] = {
+                'icon_name': icon_path.name,
+                'icon_path': os.fspath(icon_path.relative_to(ICON_CACHE_DIR)),
+            }
+            tmp_file = INDEX_FILE.with_suffix('.json.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_file, INDEX_FILE)
+    except OSError as e:
+        logger.warning(f"Could not update extraction cache: {e}")
+
+def _write_desktop_file(desktop_file, content):
+    """
+    Write content to desktop_file atomically: a crash leaves either the old
+    entry or the new one, never a truncated file. The mode is set at creation.
+    """
+    tmp_file = desktop_file.with_suffix('.desktop.tmp')
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o755)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, desktop_file)
+    except BaseException:
+        if tmp_file.exists():
+            tmp_file.unlink()
+        raise
+
+def _run_extract(appimage_exe, temp_path, pattern=None):
+    """Run the AppImage's --appimage-extract, optionally limited to one pattern."""
+    cmd = [appimage_exe, '--appimage-extract']
+    if pattern:
+        cmd.append(pattern)
+    # Only stderr is kept, as bytes, and it is decoded on failure only.
+    # No shell and an absolute argv[0]: the runtime is exec'd directly. The
+    # runtime always extracts into ./squashfs-root, so cwd can't be dropped to
+    # qualify for posix_spawn; CPython 3.10+ uses vfork here instead, which also
+    # avoids copying the monitor's heap.
+    return subprocess.run(
+        cmd,
+        cwd=os.fspath(temp_path),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        timeout=60
+    )
+
+def _extract_icon_paths(appimage_exe, temp_path):
+    """
+    Extract only the paths that usually hold icons. Returns False if the
+    runtime rejects pattern extraction (e.g. type-1 AppImages) or it fails.
+    """
+    for pattern in ICON_EXTRACT_PATTERNS:
+        try:
+            result = _run_extract(appimage_exe, temp_path, pattern)
+        except (subprocess.TimeoutExpired, OSError) as e:
+            logger.debug("Pattern extraction failed for %s: %s", appimage_exe, e)
+            return False
+        if result.returncode != 0:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Pattern extraction failed for %s: %s",
+                             appimage_exe, result.stderr.decode(errors='replace'))
+            return False
+    return True
+
+def _path_dimensions(icon_path):
+    """
+    Read (width, height) from an icon theme directory such as 256x256/apps.
+    Placeholder directories like electron-builder's 0x0 give None.
+    """
+    match = ICON_SIZE_RE.search(icon_path)
+    if not match:
+        return None
+    width, height = int(match.group(1)), int(match.group(2))
+    return (width, height) if width and height else None
+
+def _read_header(path, size):
+    """Read the first size bytes with a raw fd, skipping Python's buffered I/O."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+def _png_dimensions(icon_path):
+    """
+    Read (width, height) straight from the PNG IHDR header. Falls back to PIL
+    for files that don't carry a standard PNG header.
+    """
+    header = _read_header(icon_path, 24)
+    if header[:8] == PNG_SIGNATURE and header[12:16] == b'IHDR':
+        return struct.unpack('>II', header[16:24])
+    if Image is None:
+        return None
+    with Image.open(icon_path) as img:
+        return img.size
+
+def _cache_icon(icon_path, dest_path, file_size):
+    """
+    Place icon_path at dest_path, hardlinking when both are on the same
+    filesystem. Returns False if an icon of the same size is already cached,
+    or another worker created dest_path first.
+    """
+    try:
+        # lstat so a dangling symlink left in the cache is replaced, not kept
+        st = dest_path.lstat()
+        if stat.S_ISREG(st.st_mode) and st.st_size == file_size:
+            return False
+        dest_path.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        try:
+            _link_or_copy_icon(icon_path, dest_path, file_size)
+        except FileNotFoundError:
+            # The cache tree was removed after the directory was created;
+            # forget it, recreate it and retry once
+            _ensured_dirs.discard(dest_path.parent)
+            _ensure_dir(dest_path.parent)
+            _link_or_copy_icon(icon_path, dest_path, file_size)
+    except FileExistsError:
+        return False
+    return True
+
+def _link_or_copy_icon(icon_path, dest_path, file_size):
+    """Hardlink icon_path to dest_path, copying across filesystems."""
+    try:
+        # link(2) does not follow symlinks; link the target so the cache never
+        # holds a relative symlink into the extraction dir
+        os.link(os.path.realpath(icon_path), dest_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        _copy_icon(icon_path, dest_path, file_size)
+
+def _clone_file(src_fd, dst_fd, file_size):
+    """
+    Let the kernel copy (or reflink, on COW filesystems) src into dst.
+    Returns False if neither copy_file_range nor FICLONE copied it in full.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            copied = 0
+            while copied < file_size:
+                count = os.copy_file_range(src_fd, dst_fd, file_size - copied)
+                if count == 0:
+                    break
+                copied += count
+            # A short copy leaves dst truncated; let FICLONE or copyfile redo it
+            if copied == file_size:
+                return True
+        except OSError:
+            pass
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+def _copy_icon(icon_path, dest_path, file_size):
+    """Copy icon data only; cached icons need none of the source metadata."""
+    with open(icon_path, 'rb') as src, open(dest_path, 'xb') as dst:
+        if _clone_file(src.fileno(), dst.fileno(), file_size):
+            return
+    shutil.copyfile(icon_path, dest_path)
+
+def _iter_icons(root):
+    """
+    Yield DirEntry objects for icon files under root, without descending into
+    symlinked directories. Dangling icon symlinks are skipped.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError:
+            # Skip unreadable directories, as os.walk does
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    # Slice off the suffix so only the suffix is lowercased
+                    name = entry.name
+                    dot = name.rfind('.')
+                    # is_file() follows symlinks, so links whose target was
+                    # never extracted are dropped here
+                    if dot >= 0 and name[dot:].lower() in ICON_SUFFIXES and entry.is_file():
+                        yield entry
+
 class AppImageHandler(FileSystemEventHandler):
     def __init__(self, appimage_dir, desktop_dir):
         self.appimage_dir = Path(appimage_dir)
         self.desktop_dir = Path(desktop_dir)
         self.desktop_dir.mkdir(parents=True, exist_ok=True)
+        _ensure_icon_cache_dirs()
+        # Process simultaneous drops concurrently, off the observer thread
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        self._db_timer = None
+        self._db_lock = threading.Lock()
+        # Per-path settle deadlines and the one timer waiting on each, so
+        # bursts of events for a file coalesce without a thread per event
+        self._pending = {}
+        self._timers = {}
+        self._stopped = False
+        self._lock = threading.Lock()
         
     def on_created(self, event):
-        if not event.is_directory and event.src_path.endswith('.AppImage'):
+        if event.is_directory:
+            return
+        if event.src_path.endswith('.AppImage'):
             logger.info(f"New AppImage detected: {event.src_path}")
-            self.generate_desktop_file(Path(event.src_path))
+            self._schedule(event.src_path)
+        else:
+            self._touch(event.src_path)
     
     def on_moved(self, event):
-        if not event.is_directory and event.dest_path.endswith('.AppImage'):
+        if event.is_directory:
+            return
+        # The old name no longer exists; don't process it
+        self._cancel(event.src_path)
+        if event.dest_path.endswith('.AppImage'):
             logger.info(f"AppImage moved to: {event.dest_path}")
-            self.generate_desktop_file(Path(event.dest_path))
+            self._schedule(event.dest_path)
+
+    def on_modified(self, event):
+        # Writes or chmod +x right after a drop push back that file's deadline
+        if not event.is_directory:
+            self._touch(event.src_path)
+
+    def _touch(self, path):
+        """
+        Push back the deadline of the pending AppImage an event on path belongs
+        to: path itself, or a download beside it such as foo.AppImage.part.
+        """
+        if path not in self._pending:
+            path = path.rpartition('.')[0]
+            if path not in self._pending:
+                return
+        self._schedule(path)
+
+    def _cancel(self, path):
+        """Forget any pending event for path."""
+        with self._lock:
+            self._pending.pop(path, None)
+            timer = self._timers.pop(path, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _schedule(self, path):
+        """Push back the settle deadline for path; it is processed once events stop."""
+        with self._lock:
+            if self._stopped:
+                return
+            pending = path in self._pending
+            self._pending[path] = time.monotonic() + EVENT_SETTLE_DELAY
+            if not pending:
+                self._start_timer(path, EVENT_SETTLE_DELAY)
+
+    def _start_timer(self, path, delay):
+        """Wait delay seconds, then re-check path's deadline. Call with _lock held."""
+        timer = threading.Timer(delay, self._process, args=(path,))
+        self._timers[path] = timer
+        timer.start()
+
+    def _process(self, path):
+        """Hand path to the worker pool once its deadline has passed."""
+        with self._lock:
+            deadline = self._pending.get(path)
+            if deadline is None or self._stopped:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                self._start_timer(path, remaining)
+                return
+            del self._pending[path]
+            del self._timers[path]
+            # An empty file is a download placeholder; the rename that
+            # completes it schedules it again
+            try:
+                if os.stat(path).st_size == 0:
+                    return
+            except FileNotFoundError:
+                return
+            # Submit under the lock so stop() cannot shut the pool down first
+            self.executor.submit(self.generate_desktop_file, Path(path))
+
+    def stop(self):
+        """Drop unsettled events and wait for in-flight AppImages to finish."""
+        with self._lock:
+            self._stopped = True
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            self._pending.clear()
+        self.executor.shutdown(wait=True)
 
     def detect_category(self, app_name):
         """Detect application category based on keywords in the name."""
-        app_name_lower = app_name.lower()
-        
-        # Browser detection
-        if any(browser in app_name_lower for browser in ['chrome', 'firefox', 'edge', 'brave', 'opera', 'safari', 'chromium', 'librewolf', 'libre']):
-            return 'Network;WebBrowser;'
-        
-        # Development tools
-        if any(dev in app_name_lower for dev in ['code', 'studio', 'ide', 'editor', 'vim', 'emacs', 'sublime']):
-            return 'Development;IDE;'
-        
-        # Media players
-        if any(media in app_name_lower for media in ['player', 'vlc', 'mpv', 'kodi', 'spotify', 'audacity']):
-            return 'AudioVideo;Audio;Video;'
-        
-        # Image editors
-        if any(img in app_name_lower for img in ['gimp', 'inkscape', 'blender', 'krita', 'darktable']):
-            return 'Graphics;2DGraphics;3DGraphics;'
-        
-        # Office applications
-        if any(office in app_name_lower for office in ['libreoffice', 'openoffice', 'word', 'excel', 'powerpoint']):
-            return 'Office;'
-        
-        # Games
-        if any(game in app_name_lower for game in ['game', 'steam', 'minecraft', 'roblox']):
-            return 'Game;'
-        
-        # System tools
-        if any(sys_tool in app_name_lower for sys_tool in ['terminal', 'system', 'admin', 'disk', 'backup']):
-            return 'System;'
-        
-        # Default category
-        return 'Utility;'
+        match = CATEGORY_RE.match(app_name.lower())
+        return CATEGORY_MAP[match.lastgroup] if match else 'Utility;'
 
     def extract_and_cache_icons(self, appimage_path):
         """
-        Ironclad icon extraction: extract all icons, score them, cache all, return best.
+        Ironclad icon extraction: extract all icons, score them, cache all, return
+        the best icon's path in the icon cache.
         """
         app_name = appimage_path.stem
-        icon_cache_dir = Path.home() / '.local/share/icons/hicolor'
-        icon_cache_dir.mkdir(parents=True, exist_ok=True)
+        icon_cache_dir = ICON_CACHE_DIR
+        _ensure_dir(icon_cache_dir)
+        # Resolve once; every extract call then execs this absolute path directly
+        appimage_exe = os.fspath(appimage_path.resolve())
         
-        # Create unique temp directory for extraction
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-            logger.info(f"Extracting {appimage_path} to {temp_path}")
+        # Create unique temp directories for extraction, removed on the way out
+        with ExitStack() as temp_dirs:
+            temp_path = Path(temp_dirs.enter_context(
+                tempfile.TemporaryDirectory(prefix='appimg-', dir=EXTRACT_TMP_DIR)))
+            logger.debug("Extracting %s to %s", appimage_path, temp_path)
             
             try:
-                # Extract AppImage
-                result = subprocess.run(
-                    [str(appimage_path), '--appimage-extract'],
-                    cwd=temp_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
-                
-                if result.returncode != 0:
-                    logger.warning(f"Failed to extract AppImage: {result.stderr}")
-                    return None
-                
-                # Find all icon files recursively
+                # Extract only the usual icon locations first
                 icon_files = []
-                for root, dirs, files in os.walk(temp_path):
-                    for file in files:
-                        if file.lower().endswith(('.png', '.svg', '.xpm', '.ico')):
-                            icon_path = Path(root) / file
-                            icon_files.append(icon_path)
+                if _extract_icon_paths(appimage_exe, temp_path):
+                    icon_files = list(_iter_icons(temp_path))
+                
+                # Fall back to extracting the whole AppImage
+                if not icon_files:
+                    logger.info(f"No icons in standard locations, extracting all of {appimage_path}")
+                    temp_path = Path(temp_dirs.enter_context(tempfile.TemporaryDirectory(prefix='appimg-')))
+                    logger.debug("Extracting %s to %s", appimage_path, temp_path)
+                    result = _run_extract(appimage_exe, temp_path)
+                    
+                    if result.returncode != 0:
+                        logger.warning(f"Failed to extract AppImage: {result.stderr.decode(errors='replace')}")
+                        return None
+                    
+                    # Find all icon files recursively
+                    icon_files = list(_iter_icons(temp_path))
                 
                 if not icon_files:
                     logger.warning(f"No icons found in {appimage_path}")
                     return None
                 
-                logger.info(f"Found {len(icon_files)} icons in {appimage_path}")
+                logger.debug("Found %d icons in %s", len(icon_files), appimage_path)
                 
                 # Score and select best icon
                 best_icon = None
                 best_score = -1
                 
-                for icon_path in icon_files:
-                    score = 0
-                    file_size = icon_path.stat().st_size
-                    
-                    # Prefer SVG (vector, scalable)
-                    if icon_path.suffix.lower() == '.svg':
-                        score += 1000
-                    # Then PNG (good quality, common)
-                    elif icon_path.suffix.lower() == '.png':
-                        score += 500
-                    # Then XPM (legacy but supported)
-                    elif icon_path.suffix.lower() == '.xpm':
-                        score += 100
-                    # Then ICO (Windows format)
-                    elif icon_path.suffix.lower() == '.ico':
-                        score += 50
-                    
-                    # Prefer larger files (more detail)
-                    score += min(file_size // 1024, 100)  # Cap at 100 points
-                    
-                    # Try to get pixel dimensions for PNG files
-                    if icon_path.suffix.lower() == '.png':
-                        try:
-                            from PIL import Image
-                            with Image.open(icon_path) as img:
-                                width, height = img.size
-                                score += min(width * height // 1000, 200)  # Cap at 200 points
-                        except ImportError:
-                            logger.warning("PIL not available, using file size for scoring")
-                        except Exception as e:
-                            logger.warning(f"Could not get PNG dimensions: {e}")
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_icon = icon_path
+                svg_icons = []
+                bitmap_icons = []
+                for entry in icon_files:
+                    if entry.name.lower().endswith('.svg'):
+                        svg_icons.append(entry)
+                    else:
+                        bitmap_icons.append(entry)
+                
+                # Prefer SVG (vector, scalable): any SVG outscores every bitmap,
+                # so take the largest one and skip bitmap scoring entirely
+                if svg_icons:
+                    best_entry = max(svg_icons, key=lambda entry: entry.stat().st_size)
+                    best_icon = Path(best_entry.path)
+                    best_score = 1000 + min(best_entry.stat().st_size // 1024, 100)
+                else:
+                    for entry in bitmap_icons:
+                        icon_path = Path(entry.path)
+                        score = 0
+                        file_size = entry.stat().st_size
+                        
+                        # Then PNG (good quality, common)
+                        if icon_path.suffix.lower() == '.png':
+                            score += 500
+                        # Then XPM (legacy but supported)
+                        elif icon_path.suffix.lower() == '.xpm':
+                            score += 100
+                        # Then ICO (Windows format)
+                        elif icon_path.suffix.lower() == '.ico':
+                            score += 50
+                        
+                        # Prefer larger files (more detail)
+                        score += min(file_size // 1024, 100)  # Cap at 100 points
+                        
+                        # Try to get pixel dimensions for PNG files
+                        if icon_path.suffix.lower() == '.png':
+                            try:
+                                dimensions = _path_dimensions(entry.path) or _png_dimensions(icon_path)
+                                if dimensions:
+                                    width, height = dimensions
+                                    score += min(width * height // 1000, 200)  # Cap at 200 points
+                            except Exception as e:
+                                logger.warning(f"Could not get PNG dimensions: {e}")
+                        
+                        if score > best_score:
+                            best_score = score
+                            best_icon = icon_path
                 
                 if not best_icon:
                     logger.warning("No suitable icon found")
                     return None
                 
-                logger.info(f"Selected best icon: {best_icon} (score: {best_score})")
+                logger.info(f"Selected best icon: {best_icon} (score: {best_score}, {len(icon_files)} icons found)")
                 
-                # Copy all icons to appropriate cache directories
-                for icon_path in icon_files:
+                # Copy icons to appropriate cache directories; bitmaps are only
+                # needed when there is no SVG, unless everything is to be cached
+                icons_to_cache = icon_files if CACHE_ALL_ICONS or not svg_icons else svg_icons
+                best_dest = None
+                for entry in icons_to_cache:
+                    icon_path = Path(entry.path)
                     # Use stem (no extension) for icon name in cache
                     icon_name = icon_path.stem
-                    file_size = icon_path.stat().st_size
+                    file_size = entry.stat().st_size
                     
                     # Determine size category based on file size and type
                     if icon_path.suffix.lower() == '.svg':
                         # SVG is scalable, put in scalable directory
                         cache_subdir = icon_cache_dir / 'scalable/apps'
-                        cache_subdir.mkdir(parents=True, exist_ok=True)
-                        dest_path = cache_subdir / icon_name
+                        _ensure_dir(cache_subdir)
                     else:
                         # For bitmap icons, estimate size from file size
                         if file_size < 5000:  # Small icon
@@ -191,16 +623,17 @@ class AppImageHandler(FileSystemEventHandler):
                             size_dir = '128x128'
                         
                         cache_subdir = icon_cache_dir / f'{size_dir}/apps'
-                        cache_subdir.mkdir(parents=True, exist_ok=True)
-                        dest_path = cache_subdir / icon_name
+                        _ensure_dir(cache_subdir)
                     
                     # Copy icon to cache (without extension)
-                    dest_path_no_ext = cache_subdir / f"{icon_name}"
-                    shutil.copy2(icon_path, dest_path_no_ext)
-                    logger.info(f"Cached icon: {dest_path_no_ext}")
+                    dest_path = cache_subdir / icon_name
+                    if icon_path == best_icon:
+                        best_dest = dest_path
+                    if _cache_icon(icon_path, dest_path, file_size) and logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Cached icon: %s", dest_path)
                 
-                # Return the best icon name for desktop file (without extension)
-                return best_icon.stem
+                # Return the cached best icon; its name has no extension
+                return best_dest
                 
             except subprocess.TimeoutExpired:
                 logger.error(f"Timeout extracting {appimage_path}")
@@ -215,8 +648,17 @@ class AppImageHandler(FileSystemEventHandler):
             app_name = appimage_path.stem
             desktop_file = self.desktop_dir / f"{app_name}.desktop"
             
-            # Extract and cache icons
-            icon_name = self.extract_and_cache_icons(appimage_path)
+            # Reuse the icon from a previous run on identical content
+            fingerprint = _fingerprint(appimage_path)
+            icon_name = _cached_icon_name(fingerprint)
+            if icon_name:
+                logger.info(f"Using cached icon for {appimage_path}: {icon_name}")
+            else:
+                # Extract and cache icons
+                icon_path = self.extract_and_cache_icons(appimage_path)
+                icon_name = icon_path.name if icon_path else None
+                if icon_path:
+                    _store_icon_path(fingerprint, icon_path)
             
             # Detect category
             category = self.detect_category(app_name)
@@ -233,24 +675,41 @@ Categories={category}
 """
             
             # Write desktop file
-            with open(desktop_file, 'w') as f:
-                f.write(desktop_content)
-            os.chmod(desktop_file, 0o755)
+            _write_desktop_file(desktop_file, desktop_content)
             logger.info(f"Generated desktop file: {desktop_file}")
             
-            # Update desktop database
-            try:
-                subprocess.run(['update-desktop-database', str(self.desktop_dir)], 
-                             capture_output=True, check=True)
-                logger.info("Updated desktop database")
-            except subprocess.CalledProcessError as e:
-                logger.warning(f"Failed to update desktop database: {e}")
-            except FileNotFoundError:
-                logger.warning("update-desktop-database not found")
+            # Update desktop database once the burst of events settles
+            self._schedule_db_update()
                 
         except Exception as e:
             logger.error(f"Error generating desktop file for {appimage_path}: {e}")
 
+    def _schedule_db_update(self):
+        """(Re)arm the debounce timer so a burst of events triggers one update."""
+        with self._db_lock:
+            if self._db_timer:
+                self._db_timer.cancel()
+            self._db_timer = threading.Timer(DB_UPDATE_DELAY, self._flush_db)
+            self._db_timer.start()
+
+    def _flush_db(self):
+        """Rebuild the desktop database."""
+        with self._db_lock:
+            self._db_timer = None
+        if not UPDATE_DB:
+            logger.warning("update-desktop-database not found")
+            return
+        try:
+            # Its output is only useful when debugging
+            stderr = subprocess.PIPE if logger.isEnabledFor(logging.DEBUG) else subprocess.DEVNULL
+            subprocess.run([UPDATE_DB, str(self.desktop_dir)],
+                           stdout=subprocess.DEVNULL, stderr=stderr, check=True)
+            logger.info("Updated desktop database")
+        except subprocess.CalledProcessError as e:
+            logger.warning(f"Failed to update desktop database: {e}")
+            if e.stderr:
+                logger.debug(e.stderr.decode(errors='replace'))
+
 def main():
     # Default directories
     appimage_dir = Path.home() / "AppImages"
@@ -270,13 +729,16 @@ def main():
     observer.schedule(event_handler, str(appimage_dir), recursive=False)
     observer.start()
     
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        logger.info("Stopping AppImage monitor")
-        observer.stop()
+    # Block until SIGINT/SIGTERM instead of polling, so the idle monitor never wakes
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    stop.wait()
+    
+    logger.info("Stopping AppImage monitor")
+    observer.stop()
     observer.join()
+    event_handler.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file